@@ -5,28 +5,86 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
 from datetime import datetime, timezone
+from functools import lru_cache
+import logging
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import Dict, Iterable, List, Optional, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
-_client = None
-db = None
+logger = logging.getLogger(__name__)
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+@lru_cache(maxsize=1)
+def get_client() -> AsyncIOMotorClient:
+    """Process-wide Motor client; its connection pool is shared by all requests.
+
+    Size MONGO_MAX_POOL_SIZE to roughly workers * concurrent requests per worker.
+    """
+    return AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 10)),
+        serverSelectionTimeoutMS=2000,
+    )
+
+def get_db() -> Optional[AsyncIOMotorDatabase]:
+    """Shared database handle, or None if DATABASE_URL/DATABASE_NAME are not set
+
+    The client is created on first use rather than at import. PyMongo clients
+    are not fork-safe, so under gunicorn --preload each worker must build its
+    own after the fork.
+    """
+    if not (database_url and database_name):
+        return None
+    return get_client()[database_name]
+
+def get_fs_bucket(db: AsyncIOMotorDatabase) -> AsyncIOMotorGridFSBucket:
+    """GridFS bucket on the given database.
+
+    Build it per use from a coroutine: the constructor binds the client to the
+    current event loop, which at import time is not the one serving requests.
+    """
+    return AsyncIOMotorGridFSBucket(db)
+
+# Upper bound on documents returned by a single list read
+MAX_LIST_LIMIT = 1000
+
+# Text fields left out of list reads unless the caller asks for full documents
+LIST_PROJECTIONS = {
+    "document": {"extracted_text": 0, "extracted_summary": 0},
+}
+
+# Secondary indexes for frequently filtered fields, per collection
+INDEXES = {
+    "document": [[("related_type", 1), ("related_id", 1)]],
+}
+
+async def ensure_indexes(db: Optional[AsyncIOMotorDatabase]):
+    """Create secondary indexes (no-op for indexes that already exist)
+
+    Failures (e.g. Mongo unreachable) are logged rather than raised so the app
+    still starts and /test can report the database state.
+    """
+    if db is None:
+        return
+    for collection_name, keys_list in INDEXES.items():
+        for keys in keys_list:
+            try:
+                await db[collection_name].create_index(keys)
+            except Exception as e:
+                logger.warning("Could not create index %s on %s: %s", keys, collection_name, e)
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(db: AsyncIOMotorDatabase, collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -40,16 +98,54 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(db: AsyncIOMotorDatabase, collection_name: str, items: List[Union[BaseModel, dict]]):
+    """Insert many documents with timestamps in a single unordered batch"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
-    if limit:
-        cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    if not items:
+        return []
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        data_dict = data.model_dump() if isinstance(data, BaseModel) else data.copy()
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    result = await db[collection_name].insert_many(docs, ordered=False)
+    return [str(i) for i in result.inserted_ids]
+
+async def get_documents_async(db: AsyncIOMotorDatabase, collection_name: str, limit: int = 25, full: bool = False):
+    """Get the newest documents from collection with `_id` stringified server-side
+
+    Fields in LIST_PROJECTIONS are omitted unless `full` is set.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not 1 <= limit <= MAX_LIST_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIST_LIMIT}")
+
+    pipeline = [
+        {"$sort": {"_id": -1}},
+        {"$limit": limit},
+    ]
+    projection = None if full else LIST_PROJECTIONS.get(collection_name)
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline.append({"$addFields": {"_id": {"$toString": "$_id"}}})
+    cursor = db[collection_name].aggregate(pipeline, hint="_id_")
+    return await cursor.to_list(length=limit)
+
+async def get_collection_counts(db: AsyncIOMotorDatabase, collection_names: Iterable[str]) -> Dict[str, int]:
+    """Estimated document count per collection, queried concurrently"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    async def _count(name: str):
+        return name, await db[name].estimated_document_count()
+
+    return dict(await asyncio.gather(*(_count(name) for name in collection_names)))
@@ -1,37 +1,99 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+import codecs
+import re
+import time
+import orjson
+from fastapi import Body, Depends, FastAPI, UploadFile, File, Form, HTTPException, Path, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from starlette.concurrency import run_in_threadpool
+from anyio import to_thread
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from fastapi.responses import ORJSONResponse
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
 from pydantic import BaseModel
 
-from database import db, create_document, get_documents
-import importlib
+from database import (
+    get_db, get_fs_bucket, MAX_LIST_LIMIT,
+    create_document, create_documents, ensure_indexes,
+    get_collection_counts, get_documents_async,
+)
+import schemas
+
+class MongoJSONResponse(ORJSONResponse):
+    """orjson-backed response that stringifies BSON scalars such as ObjectId."""
 
-app = FastAPI(title="Tenant - Real Estate Management API")
+    def render(self, content: Any) -> bytes:
+        # default=str only sees types orjson can't serialize natively; dict/list
+        # subclasses like SON or OrderedDict are still rendered as JSON
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(
+    title="Tenant - Real Estate Management API",
+    default_response_class=MongoJSONResponse,
+)
+
+# Comma-separated allowlist, e.g. "https://app.example.com,http://localhost:3000"
+cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["authorization", "content-type"],
 )
 
+COLLECTIONS = ("tenant", "owner", "property", "lease", "sale", "expense", "document")
+
+async def require_db() -> AsyncIOMotorDatabase:
+    """Dependency: the shared database handle, or a 500 if it is not configured."""
+    db = get_db()
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    return db
+
+# -------------------- Startup --------------------
+@app.on_event("startup")
+async def _create_indexes():
+    await ensure_indexes(get_db())
+
+@app.on_event("startup")
+def _configure_threadpool():
+    # Sync handlers and run_in_threadpool share anyio's default limiter (40)
+    to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE", 200))
+
 # -------------------- Root & Health --------------------
+# Constant body, rendered once and reused for every request
+_ROOT_RESPONSE = MongoJSONResponse({"message": "Tenant API running"})
+
 @app.get("/")
-def read_root():
-    return {"message": "Tenant API running"}
+async def read_root():
+    return _ROOT_RESPONSE
+
+# Health checks are polled constantly by load balancers; serve the last result
+# for HEALTH_TTL seconds instead of hitting Mongo on every call. No lock is
+# needed since all handlers run on the worker's single event loop.
+HEALTH_TTL = float(os.getenv("HEALTH_TTL", 1))
+_health_cache: Optional[tuple] = None  # (expires_at, response)
 
 @app.get("/test")
-def test_database():
+async def test_database():
+    global _health_cache
+    now = time.monotonic()
+    if _health_cache is not None and _health_cache[0] > now:
+        return _health_cache[1]
+
+    db = get_db()
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
         "database_url": None,
         "database_name": None,
         "connection_status": "Not Connected",
-        "collections": []
+        "collections": [],
+        "counts": {},
     }
     try:
         if db is not None:
@@ -39,68 +101,77 @@ def test_database():
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
             try:
-                collections = db.list_collection_names()
+                # Both lookups are in flight at once instead of back to back
+                collections, counts = await asyncio.gather(
+                    db.list_collection_names(),
+                    get_collection_counts(db, COLLECTIONS),
+                )
                 response["collections"] = collections[:20]
+                response["counts"] = counts
             except Exception as e:
                 response["database"] = f"⚠️ Connected but Error: {str(e)[:80]}"
         else:
             response["database"] = "⚠️ Available but not initialized"
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:80]}"
+    _health_cache = (now + HEALTH_TTL, response)
     return response
 
 # -------------------- Schemas Introspection --------------------
+SCHEMA_MODEL_NAMES = (
+    "Tenant", "Owner", "Property", "Lease", "Sale", "Expense", "Document"
+)
+
+def _schema_payload() -> bytes:
+    """Build the JSON schema payload for all models."""
+    # A missing or renamed model raises here, failing the import
+    return orjson.dumps({
+        name.lower(): getattr(schemas, name).model_json_schema()
+        for name in SCHEMA_MODEL_NAMES
+    })
+
+# Models never change at runtime, so the payload is built once at import. With
+# gunicorn --preload, forked workers share these bytes copy-on-write.
+_SCHEMA_BYTES = _schema_payload()
+
 @app.get("/schema")
-def get_schema() -> Dict[str, Any]:
+async def get_schema():
     """Expose Pydantic models defined in schemas.py so tools/frontends can build forms dynamically."""
-    try:
-        schemas_mod = importlib.import_module("schemas")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unable to import schemas: {e}")
-
-    model_names = [
-        "Tenant", "Owner", "Property", "Lease", "Sale", "Expense", "Document"
-    ]
-    out: Dict[str, Any] = {}
-    for name in model_names:
-        model = getattr(schemas_mod, name, None)
-        if model is not None and issubclass(model, BaseModel):
-            out[name.lower()] = model.model_json_schema()
-    return out
+    return Response(content=_SCHEMA_BYTES, media_type="application/json")
 
-# -------------------- Generic List & Create --------------------
-class ListResponse(BaseModel):
-    items: List[dict]
+# -------------------- File upload & lightweight extraction --------------------
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+# Only the head of a text upload is decoded; the full file lives in GridFS
+PREVIEW_BYTES = 4096
+PREVIEW_CHARS = 1000
 
-VALID_COLLECTIONS = {"tenant","owner","property","lease","sale","expense","document"}
+# One comma-separated tag, without surrounding whitespace
+_TAG_RE = re.compile(r"[^,\s][^,]*[^,\s]|[^,\s]")
 
-@app.get("/api/{collection}", response_model=ListResponse)
-async def list_items(collection: str, limit: int = 25):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not configured")
-    if collection not in VALID_COLLECTIONS:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    items = get_documents(collection, limit=limit)
-    def normalize(doc):
-        d = {}
-        for k, v in doc.items():
-            if k == "_id":
-                d[k] = str(v)
-            else:
-                d[k] = v
-        return d
-    return {"items": [normalize(i) for i in items]}
+def _excel_note(fp: BinaryIO) -> str:
+    # Simple Excel extraction via note (no heavy parser here)
+    return "Excel file uploaded (preview disabled)."
 
-@app.post("/api/{collection}")
-async def create_item(collection: str, payload: Dict[str, Any]):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not configured")
-    if collection not in VALID_COLLECTIONS:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    inserted_id = create_document(collection, payload)
-    return {"id": inserted_id, "message": "Created"}
+def _pdf_note(fp: BinaryIO) -> str:
+    # Naive PDF handling
+    return "PDF uploaded (text extraction not available in lightweight mode)."
+
+# Extraction handlers may be CPU-bound once real parsers are wired in, so they
+# run in the threadpool, at most one per core at a time
+_EXTRACT_SEM = asyncio.Semaphore(os.cpu_count() or 2)
+
+# Extensions whose bytes are decoded as UTF-8 text while streaming; the
+# decoded preview is their extracted text
+_TEXT_EXTENSIONS = {".csv", ".tsv"}
+
+# Binary formats: each handler gets the upload's spooled file (kept on disk by
+# Starlette past 1 MiB), rewound to the start, and returns the extracted text
+_EXT_HANDLERS: Dict[str, Callable[[BinaryIO], Optional[str]]] = {
+    ".xlsx": _excel_note,
+    ".xls": _excel_note,
+    ".pdf": _pdf_note,
+}
 
-# -------------------- File upload & lightweight extraction --------------------
 @app.post("/api/upload")
 async def upload_document(
     file: UploadFile = File(...),
@@ -108,46 +179,128 @@ async def upload_document(
     tags: Optional[str] = Form(None),
     related_type: Optional[str] = Form("general"),
     related_id: Optional[str] = Form(None),
+    db: AsyncIOMotorDatabase = Depends(require_db),
 ):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not configured")
-
     filename = file.filename or "uploaded"
     content_type = file.content_type or "application/octet-stream"
-    raw = await file.read()
+    ext = os.path.splitext(filename)[1].lower()
+    is_text = ext in _TEXT_EXTENSIONS
 
-    extracted_text = None
+    # Stream the upload into GridFS chunk by chunk instead of buffering it,
+    # decoding the first PREVIEW_BYTES of CSV/TSV text in the same pass
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore") if is_text else None
+    preview_remaining = PREVIEW_BYTES if is_text else 0
+    text_parts: List[str] = []
+    fs_bucket = get_fs_bucket(db)
+    grid_in = fs_bucket.open_upload_stream(filename, metadata={"content_type": content_type})
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await grid_in.write(chunk)
+            if preview_remaining > 0:
+                head = memoryview(chunk)[:preview_remaining]
+                text_parts.append(decoder.decode(head, final=False))
+                preview_remaining -= len(head)
+        await grid_in.close()
+    except BaseException:
+        # Also covers cancellation (client disconnect, shutdown), which is not
+        # an Exception, so partial chunks never outlive a failed upload
+        await grid_in.abort()
+        raise
 
-    # Try simple text extraction for CSV/TSV
+    # From here on the GridFS file is complete; drop it again if no Document
+    # record ends up referencing it
     try:
-        if filename.lower().endswith((".csv", ".tsv")):
-            extracted_text = raw.decode(errors="ignore")
-    except Exception:
-        pass
+        extracted_text = None
+        handler = _EXT_HANDLERS.get(ext)
+        if decoder is not None:
+            text_parts.append(decoder.decode(b"", final=True))
+            extracted_text = "".join(text_parts)[:PREVIEW_CHARS]
+        elif handler is not None:
+            async with _EXTRACT_SEM:
+                await file.seek(0)
+                extracted_text = await run_in_threadpool(handler, file.file)
 
-    # Try simple Excel extraction via note (no heavy parser here)
-    if extracted_text is None and filename.lower().endswith((".xlsx", ".xls")):
-        extracted_text = "Excel file uploaded (preview disabled)."
+        doc = {
+            "title": title or filename,
+            "file_id": str(grid_in._id),
+            "filename": filename,
+            "content_type": content_type,
+            "tags": _TAG_RE.findall(tags) if tags else [],
+            "related_type": related_type,
+            "related_id": related_id,
+            "extracted_text": extracted_text,
+        }
 
-    # Naive PDF handling
-    if extracted_text is None and filename.lower().endswith(".pdf"):
-        extracted_text = "PDF uploaded (text extraction not available in lightweight mode)."
-
-    doc = {
-        "title": title or filename,
-        "filename": filename,
-        "content_type": content_type,
-        "tags": [t.strip() for t in (tags.split(",") if tags else []) if t.strip()],
-        "related_type": related_type,
-        "related_id": related_id,
-        "extracted_text": extracted_text,
-    }
+        inserted_id = await create_document(db, "document", doc)
+    except BaseException:
+        await fs_bucket.delete(grid_in._id)
+        raise
+    return {"id": inserted_id, "message": "Uploaded", "preview": extracted_text[:PREVIEW_CHARS] if extracted_text else None}
 
-    inserted_id = create_document("document", doc)
-    return {"id": inserted_id, "message": "Uploaded", "preview": extracted_text[:1000] if extracted_text else None}
+# -------------------- Generic List & Create --------------------
+class ListResponse(BaseModel):
+    items: List[dict]
+
+# Unknown collections are rejected while validating the path parameter,
+# before any handler code runs
+COLL_PATTERN = f"^({'|'.join(COLLECTIONS)})$"
+
+# ListResponse only documents the shape in OpenAPI; items come straight from
+# Mongo, so they are returned without re-validating each one through Pydantic
+@app.get("/api/{collection}", responses={200: {"model": ListResponse}})
+async def list_items(
+    collection: str = Path(..., pattern=COLL_PATTERN),
+    limit: int = Query(25, ge=1, le=MAX_LIST_LIMIT),
+    full: bool = Query(False, description="Include fields omitted from list reads, e.g. extracted_text"),
+    db: AsyncIOMotorDatabase = Depends(require_db),
+):
+    items = await get_documents_async(db, collection, limit=limit, full=full)
+    return MongoJSONResponse({"items": items}, status_code=200)
+
+@app.post("/api/{collection}")
+async def create_item(
+    collection: str = Path(..., pattern=COLL_PATTERN),
+    payload: Dict[str, Any] = Body(...),
+    db: AsyncIOMotorDatabase = Depends(require_db),
+):
+    inserted_id = await create_document(db, collection, payload)
+    return {"id": inserted_id, "message": "Created"}
+
+@app.post("/api/{collection}/bulk")
+async def bulk_create(
+    collection: str = Path(..., pattern=COLL_PATTERN),
+    payload: List[Dict[str, Any]] = Body(...),
+    db: AsyncIOMotorDatabase = Depends(require_db),
+):
+    try:
+        inserted_ids = await create_documents(db, collection, payload)
+    except BulkWriteError as e:
+        # Unordered inserts keep going past failures, so report what landed
+        # along with which payload indexes were rejected
+        return MongoJSONResponse(
+            {
+                "message": "Partially created",
+                "inserted": e.details.get("nInserted", 0),
+                "errors": [
+                    {"index": err.get("index"), "code": err.get("code"), "errmsg": err.get("errmsg")}
+                    for err in e.details.get("writeErrors", [])
+                ],
+            },
+            status_code=409,
+        )
+    return {"ids": inserted_ids, "message": "Created"}
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )
@@ -0,0 +1,14 @@
+"""Import smoke tests: catch FastAPI/Pydantic incompatibilities at import time."""
+import orjson
+
+import main
+
+
+def test_app_imports_with_routes():
+    paths = {route.path for route in main.app.routes}
+    assert {"/", "/test", "/schema", "/api/upload", "/api/{collection}", "/api/{collection}/bulk"} <= paths
+
+
+def test_schema_lists_all_models():
+    payload = orjson.loads(main._SCHEMA_BYTES)
+    assert set(payload) == {name.lower() for name in main.SCHEMA_MODEL_NAMES}